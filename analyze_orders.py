@@ -1,32 +1,35 @@
-import pandas as pd
+import os
+import sqlite3
 
-def analyze_weekly_orders(file_path='orders.csv'):
-    try:
-        # 1. Read the CSV data into a pandas DataFrame
-        df = pd.read_csv(file_path)
-    except FileNotFoundError:
-        print(f"Error: The file '{file_path}' was not found. Please place some orders first.")
+def analyze_weekly_orders(db_path=os.path.join('data', 'inventory.db')):
+    # 1. Orders live in the app's SQLite database, not in a CSV file
+    if not os.path.exists(db_path):
+        print(f"Error: The database '{db_path}' was not found. Please place some orders first.")
         return
 
-    # 2. Convert the 'timestamp' column to a proper datetime object
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # 3. Ensure 'quantity' is a number
-    df['quantity'] = pd.to_numeric(df['quantity'])
-
-    # 4. Group by week and sum the quantities
-    # 'W' stands for weekly frequency (ending on Sunday)
-    # We group by both item name and the week for a detailed report
-    weekly_summary = df.groupby(['item_name', pd.Grouper(key='timestamp', freq='W')])['quantity'].sum().reset_index()
-
-    # Or for a simpler total of all items per week:
-    total_weekly_summary = df.resample('W', on='timestamp')['quantity'].sum()
+    conn = sqlite3.connect(db_path)
+    try:
+        # 2. Group by week and sum the quantities inside SQLite
+        # 'weekday 0' moves each timestamp to the Sunday ending its week
+        # Deleted (rejected) orders are left out of the summary; rows without a status predate the
+        # status column and still count
+        total_weekly_summary = conn.execute("""
+            SELECT date(o.timestamp, 'weekday 0') AS week, SUM(oi.quantity)
+            FROM order_item oi
+            JOIN "order" o ON o.id = oi.order_id
+            WHERE o.status IS NULL OR o.status != 'deleted'
+            GROUP BY week
+            ORDER BY week
+        """).fetchall()
+    finally:
+        conn.close()
 
     print("--- Weekly Order Summary (Total Items) ---")
-    if total_weekly_summary.empty:
+    if not total_weekly_summary:
         print("No orders to analyze yet.")
     else:
-        print(total_weekly_summary)
+        for week, quantity in total_weekly_summary:
+            print(f"{week}    {quantity}")
 
 if __name__ == '__main__':
-    analyze_weekly_orders()
\ No newline at end of file
+    analyze_weekly_orders()
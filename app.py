@@ -1,13 +1,31 @@
 import os
+import hmac
+import gzip
+import hashlib
+import sqlite3
 import smtplib
+import time
+from html import escape
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from functools import wraps
 
+import orjson
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask.json.provider import DefaultJSONProvider
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask_sqlalchemy.record_queries import get_recorded_queries
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from werkzeug.middleware.profiler import ProfilerMiddleware
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.security import check_password_hash
 from dotenv import load_dotenv
 
 # --- Basic App Setup ---
@@ -15,25 +33,91 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
 
+# --- JSON Provider ---
+class OrjsonProvider(DefaultJSONProvider):
+    """Serialize jsonify/tojson output with orjson, keeping Flask's sorted keys and HTTP date format"""
+    option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self.option | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app.json = OrjsonProvider(app)
+
 # --- Session Configuration ---
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 
+# --- Request Size Limits ---
+app.config['MAX_CONTENT_LENGTH'] = 1024 * 1024  # Largest expected body is an admin bulk item paste
+MAX_BULK_ITEMS = 5000  # distinct names per bulk add
+NAME_LOOKUP_CHUNK = 500  # names per IN query; SQLite before 3.32 allows only 999 bound parameters
+
+# --- Rate Limiting ---
+# Nginx is the only client that reaches the app, so trust its X-Forwarded-For for the visitor's address
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1)
+# In-memory counters are enough for the single gunicorn worker
+limiter = Limiter(get_remote_address, app=app, storage_uri='memory://')
+
 # --- Environment Variable Loading ---
-ADMIN_PASSWORD_HASH = generate_password_hash(os.getenv('ADMIN_PASSWORD'))
+# A hash generated offline keeps the plaintext out of the environment; without one, ADMIN_PASSWORD is
+# compared in constant time, since hashing a secret already held in plain text only costs CPU
+ADMIN_PASSWORD_HASH = os.getenv('ADMIN_PASSWORD_HASH')
+ADMIN_PASSWORD_BYTES = os.getenv('ADMIN_PASSWORD', '').encode('utf-8')
 EMAIL_SENDER = os.getenv('EMAIL_SENDER')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')
 EMAIL_RECEIVER = os.getenv('EMAIL_RECEIVER')
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+PROFILE = os.getenv('PROFILE') == '1'
 
 # --- Database Configuration ---
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(basedir, "data", "inventory.db")}'
+DB_PATH = os.path.join(basedir, "data", "inventory.db")
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{DB_PATH}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_RECORD_QUERIES'] = PROFILE
 db = SQLAlchemy(app)
 
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection: WAL lets page views read while an order is being written,
+    and synchronous=NORMAL is durable under WAL while fsyncing far less than the default"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA cache_size=-64000")  # 64 MB page cache
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # read through up to 256 MB of memory-mapped file
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+# --- Profiling (PROFILE=1 only) ---
+SLOW_QUERY_SECONDS = 0.05
+
+if PROFILE:
+    # Per-request cProfile dumps (top 30 functions also printed) for finding hot spots
+    profile_dir = os.path.join(basedir, 'profiles')
+    os.makedirs(profile_dir, exist_ok=True)
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, restrictions=[30], profile_dir=profile_dir)
+
+    @app.after_request
+    def log_slow_queries(response):
+        for query in get_recorded_queries():
+            if query.duration > SLOW_QUERY_SECONDS:
+                print(f"Slow query ({query.duration * 1000:.0f} ms) at {query.location}: {query.statement}")
+        return response
+
 # --- Database Models ---
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -51,11 +135,18 @@ class Order(db.Model):
     deleted_at = db.Column(db.DateTime, nullable=True)
     order_items = db.relationship('OrderItem', backref='order', lazy=True, cascade="all, delete-orphan")
 
+    # Every listing filters on status and sorts or ranges on one of the timestamps
+    __table_args__ = (
+        db.Index('ix_order_status_timestamp', 'status', 'timestamp'),
+        db.Index('ix_order_status_confirmed_at', 'status', 'confirmed_at'),
+        db.Index('ix_order_status_deleted_at', 'status', 'deleted_at'),
+    )
+
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     item_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
 
 # --- Helper Functions ---
 def login_required(f):
@@ -68,29 +159,151 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+ORDERS_PER_PAGE = 20
+KEYSET_NULL_TIMESTAMP = datetime(1970, 1, 1)  # sort position of rows whose paging timestamp is NULL (oldest)
+
+def parse_cursor(value):
+    """Parse a keyset pagination cursor (`<ISO timestamp>_<id>`) from the query string; invalid values mean first page"""
+    timestamp, _, row_id = (value or '').rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except ValueError:
+        return None
+
+def keyset_page(query, column, before=None, after=None):
+    """Return one page of rows ordered by `column` newest first, plus the cursors for the
+    previous (`after`) and next (`before`) pages; a cursor is None when there is no such page.
+
+    Seeks past the cursor with a WHERE on (column, id) instead of OFFSET, so deep pages
+    cost the same as the first one; the id breaks ties between equal timestamps.
+    NULL timestamps sort and seek as KEYSET_NULL_TIMESTAMP, so those rows are listed last instead of lost.
+    """
+    id_column = column.class_.id
+    sort_column = db.func.coalesce(column, KEYSET_NULL_TIMESTAMP)
+    key = db.tuple_(sort_column, id_column)
+    if after:
+        # Going back: take the rows just newer than the cursor, oldest first, then flip them
+        rows = query.filter(key > after).order_by(sort_column.asc(), id_column.asc()).limit(ORDERS_PER_PAGE + 1).all()
+        has_newer = len(rows) > ORDERS_PER_PAGE
+        rows = rows[:ORDERS_PER_PAGE][::-1]
+        has_older = True
+    else:
+        if before:
+            query = query.filter(key < before)
+        rows = query.order_by(sort_column.desc(), id_column.desc()).limit(ORDERS_PER_PAGE + 1).all()
+        has_older = len(rows) > ORDERS_PER_PAGE
+        rows = rows[:ORDERS_PER_PAGE]
+        has_newer = before is not None
+    if not rows:
+        return rows, None, None
+    prev_after = keyset_cursor(rows[0], column) if has_newer else None
+    next_before = keyset_cursor(rows[-1], column) if has_older else None
+    return rows, prev_after, next_before
+
+def keyset_cursor(row, column):
+    """Encode a row's position for keyset_page, using the same NULL substitute as its sort expression"""
+    timestamp = getattr(row, column.key) or KEYSET_NULL_TIMESTAMP
+    return f'{timestamp.isoformat()}_{row.id}'
+
+def check_admin_password(password):
+    """Verify a login attempt against ADMIN_PASSWORD_HASH if configured, else against ADMIN_PASSWORD"""
+    if ADMIN_PASSWORD_HASH:
+        return check_password_hash(ADMIN_PASSWORD_HASH, password)
+    return hmac.compare_digest(ADMIN_PASSWORD_BYTES, password.encode('utf-8'))
+
+# --- In-Process Caches ---
+_cache = {'items_version': 0}
+
+def invalidate_items():
+    """Mark the cached catalog stale; call after committing any change to the Item table"""
+    _cache['items_version'] += 1
+
+class ItemCatalog:
+    """Immutable snapshot of the Item table plus the lookup structures derived from it"""
+    __slots__ = ('version', 'items', 'names_folded', 'names_by_field', 'json_body', 'json_gzip', 'etag')
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.items = [{'id': item_id, 'name': name} for item_id, name in rows]
+        self.names_folded = [name.casefold() for _, name in rows]
+        self.names_by_field = {f'qty_{item_id}': name for item_id, name in rows}
+        # The full list is serialized and compressed once here instead of on every request
+        self.json_body = app.json.dumps(self.items).encode('utf-8')
+        self.json_gzip = gzip.compress(self.json_body, mtime=0)
+        # Content hash rather than the version number, so it stays valid across process restarts
+        self.etag = hashlib.sha1(self.json_body).hexdigest()
+
+def get_catalog():
+    """Return the cached catalog snapshot, re-querying only after an item was changed"""
+    version = _cache['items_version']
+    catalog = _cache.get('catalog')
+    if catalog is None or catalog.version != version:
+        rows = db.session.query(Item.id, Item.name).order_by(Item.name).all()
+        catalog = ItemCatalog(version, rows)
+        _cache['catalog'] = catalog
+    return catalog
+
+def item_names_by_field():
+    """Map each order form quantity field name (qty_<id>) to its item name"""
+    return get_catalog().names_by_field
+
+SEARCH_MIN_LENGTH = 2  # a single character matches most of the catalog
+SEARCH_MAX_LENGTH = 100  # Item.name length, so a longer query cannot match anything
+
+def search_items(query):
+    """Case-insensitive search over the cached catalog's casefolded names; names starting with the query come first"""
+    if not SEARCH_MIN_LENGTH <= len(query) <= SEARCH_MAX_LENGTH:
+        return []
+    catalog = get_catalog()
+    query_folded = query.casefold()
+    prefix_matches, other_matches = [], []
+    for item, name_folded in zip(catalog.items, catalog.names_folded):
+        position = name_folded.find(query_folded)
+        if position == 0:
+            prefix_matches.append(item)
+        elif position > 0:
+            other_matches.append(item)
+    return prefix_matches + other_matches
+
+PENDING_COUNT_TTL = 30  # seconds; a safety net, order state changes invalidate it directly
+
+def get_pending_count():
+    """Number of pending orders for the admin badge, cached briefly instead of counted on every page view"""
+    cached = _cache.get('pending_count')
+    now = time.monotonic()
+    if cached is None or now - cached[1] > PENDING_COUNT_TTL:
+        count = db.session.query(db.func.count(Order.id)).filter(Order.status == 'pending').scalar()
+        cached = (count, now)
+        _cache['pending_count'] = cached
+    return cached[0]
+
+def invalidate_pending_count():
+    """Drop the cached pending count; call after committing an order status change"""
+    _cache.pop('pending_count', None)
+
 # --- Main Page Route ---
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    form_data = session.get('form_data', {})
-    items_from_db = Item.query.order_by(Item.name).all()
-    all_items_for_json = [{'id': item.id, 'name': item.name} for item in items_from_db]
-
     if request.method == 'POST':
         try:
             customer_name = request.form.get('customer_name', '').strip()
             customer_phone = request.form.get('customer_phone', '').strip()
             room_number = request.form.get('room_number', '').strip()
 
+            # Walk only the submitted fields instead of probing the form once per catalog item
+            item_names = item_names_by_field()
             order_details = {}
-            has_items = False
-            for item in items_from_db:
-                try:
-                    qty = int(request.form.get(f'qty_{item.id}', '0'))
-                    if qty > 0:
-                        order_details[item.name] = qty
-                        has_items = True
-                except (ValueError, TypeError):
+            for field, value in request.form.items():
+                item_name = item_names.get(field)
+                value = value.strip()
+                # Screening length and digits avoids try/except on blanks and junk; the length cap also keeps
+                # int() clear of its digit limit, so every value that passes parses
+                if item_name is None or len(value) > 6 or not value.isdecimal():
                     continue
+                qty = int(value)
+                if qty > 0:
+                    order_details[item_name] = qty
+            has_items = bool(order_details)
             
             if not (customer_name and customer_phone and room_number and has_items):
                 flash('⚠️ გთხოვთ შეავსოთ ყველა სავალდებულო ველი და აირჩიოთ მინიმუმ ერთი ნივთი.', 'warning')
@@ -102,22 +315,28 @@ def index():
                 room_number=room_number,
                 status='pending'
             )
-            for item_name, quantity in order_details.items():
-                new_order.order_items.append(OrderItem(item_name=item_name, quantity=quantity))
-            
             db.session.add(new_order)
+            db.session.flush()  # Assigns new_order.id
+            
+            # All line items go in as one executemany INSERT, bypassing per-object unit-of-work bookkeeping
+            db.session.execute(db.insert(OrderItem), [
+                {'order_id': new_order.id, 'item_name': item_name, 'quantity': quantity}
+                for item_name, quantity in order_details.items()
+            ])
             db.session.commit()
+            invalidate_pending_count()
 
-            # Send email notification for new order
-            send_new_order_notification(
+            # Send email notification for new order in the background
+            _mail_pool.submit(
+                send_new_order_notification,
                 customer_name=customer_name,
                 customer_phone=customer_phone,
                 room_number=room_number,
                 order=order_details
             )
 
-            flash(f'✅ შეკვეთა წარმატებით გაიგზავნა, {customer_name}!', 'success')
-            session.pop('form_data', None)
+            # Own category so the page can tell a placed order (which clears the saved draft) from other successes
+            flash(f'✅ შეკვეთა წარმატებით გაიგზავნა, {customer_name}!', 'order_success')
             return redirect(url_for('index'))
             
         except Exception as e:
@@ -126,14 +345,27 @@ def index():
             flash('❌ შეკვეთის შექმნისას მოხდა შეცდომა. გთხოვთ სცადოთ თავიდან.', 'error')
             return redirect(url_for('index'))
 
-    return render_template('index.html', items=items_from_db, all_items=all_items_for_json, form_data=form_data)
+    # Drafts are restored client-side, so without flash messages the page depends only on the catalog
+    # and its HTML is reused until an item changes
+    # The (version, html) pair is swapped in one assignment, keyed by the catalog it was rendered from,
+    # so concurrent threads can never pair one version with another version's page
+    if '_flashes' not in session:
+        cached = _cache.get('index_html')
+        if cached is None or cached[0] != _cache['items_version']:
+            catalog = get_catalog()
+            cached = (catalog.version, render_template('index.html', items_version=catalog.etag))
+            _cache['index_html'] = cached
+        return cached[1]
+
+    return render_template('index.html', items_version=get_catalog().etag)
 
 # --- Admin Authentication Routes ---
 @app.route('/admin/login', methods=['GET', 'POST'])
+@limiter.limit('5 per minute', methods=['POST'])  # every attempt costs a PBKDF2 check when a hash is configured
 def admin_login():
     if request.method == 'POST':
         password = request.form.get('password', '')
-        if password and check_password_hash(ADMIN_PASSWORD_HASH, password):
+        if password and check_admin_password(password):
             session['admin_logged_in'] = True
             session.permanent = True
             flash('✅ წარმატებით შეხვედით სისტემაში!', 'success')
@@ -163,7 +395,7 @@ def admin_panel():
     items_on_page = pagination.items
     
     # Get pending orders count for badge
-    pending_count = Order.query.filter_by(status='pending').count()
+    pending_count = get_pending_count()
 
     return render_template('admin_panel.html', items=items_on_page, pagination=pagination, 
                          search_query=search_query, pending_count=pending_count)
@@ -172,13 +404,17 @@ def admin_panel():
 @app.route('/admin/orders/pending')
 @login_required
 def admin_orders_pending():
-    orders = Order.query.filter_by(status='pending').order_by(Order.timestamp.desc()).all()
+    orders = Order.query.options(db.selectinload(Order.order_items))\
+                  .filter_by(status='pending')\
+                  .order_by(Order.timestamp.desc())\
+                  .all()
     return render_template('admin_orders_pending.html', orders=orders)
 
 @app.route('/admin/orders/confirmed')
 @login_required
 def admin_orders_confirmed():
-    page = request.args.get('page', 1, type=int)
+    before = parse_cursor(request.args.get('before'))
+    after = parse_cursor(request.args.get('after'))
     search_query = request.args.get('search', '').strip()
     
     # Date range filters
@@ -197,8 +433,8 @@ def admin_orders_confirmed():
     except ValueError:
         flash('⚠️ არასწორი თარიღის ფორმატი.', 'warning')
     
-    # Base query
-    query = Order.query.filter_by(status='confirmed')
+    # Base query; items are loaded for the whole page in one extra query
+    query = Order.query.options(db.selectinload(Order.order_items)).filter_by(status='confirmed')
     
     # Apply date range filter
     if start_date:
@@ -216,13 +452,12 @@ def admin_orders_confirmed():
             )
         )
     
-    # Default sorting by date descending
-    query = query.order_by(Order.confirmed_at.desc())
-    
-    pagination = query.paginate(page=page, per_page=20, error_out=False)
+    # Sorted by date descending, paged by confirmation time
+    orders, prev_after, next_before = keyset_page(query, Order.confirmed_at, before, after)
     return render_template('admin_orders_confirmed.html', 
-                         orders=pagination.items, 
-                         pagination=pagination, 
+                         orders=orders, 
+                         prev_after=prev_after, 
+                         next_before=next_before, 
                          search_query=search_query,
                          start_date=start_date_param or '',
                          end_date=end_date_param or '')
@@ -230,11 +465,11 @@ def admin_orders_confirmed():
 @app.route('/admin/orders/deleted')
 @login_required
 def admin_orders_deleted():
-    page = request.args.get('page', 1, type=int)
-    pagination = Order.query.filter_by(status='deleted')\
-                     .order_by(Order.deleted_at.desc())\
-                     .paginate(page=page, per_page=20, error_out=False)
-    return render_template('admin_orders_deleted.html', orders=pagination.items, pagination=pagination)
+    before = parse_cursor(request.args.get('before'))
+    after = parse_cursor(request.args.get('after'))
+    query = Order.query.options(db.selectinload(Order.order_items)).filter_by(status='deleted')
+    orders, prev_after, next_before = keyset_page(query, Order.deleted_at, before, after)
+    return render_template('admin_orders_deleted.html', orders=orders, prev_after=prev_after, next_before=next_before)
 
 @app.route('/admin/reports/weekly')
 @login_required
@@ -256,32 +491,36 @@ def admin_reports_weekly():
     except ValueError:
         flash('⚠️ არასწორი თარიღის ფორმატი.', 'warning')
     
-    # Get confirmed orders in date range
-    orders = Order.query.filter(
+    # Confirmed orders in date range
+    in_range = (
         Order.status == 'confirmed',
         Order.confirmed_at >= start_date,
         Order.confirmed_at <= end_date
-    ).all()
-    
-    # Aggregate item quantities
-    item_totals = {}
-    for order in orders:
-        for item in order.order_items:
-            if item.item_name in item_totals:
-                item_totals[item.item_name] += item.quantity
-            else:
-                item_totals[item.item_name] = item.quantity
+    )
+    total_orders = db.session.query(db.func.count(Order.id)).filter(*in_range).scalar()
     
-    # Sort by quantity
-    sorted_items = sorted(item_totals.items(), key=lambda x: x[1], reverse=True)
+    # Aggregate item quantities in SQL, sorted by quantity
+    total_quantity = db.func.sum(OrderItem.quantity)
+    sorted_items = db.session.query(OrderItem.item_name, total_quantity)\
+                     .join(Order)\
+                     .filter(*in_range)\
+                     .group_by(OrderItem.item_name)\
+                     .order_by(total_quantity.desc())\
+                     .all()
     
     return render_template('admin_reports_weekly.html', 
                          items=sorted_items, 
                          start_date=start_date, 
                          end_date=end_date,
-                         total_orders=len(orders))
+                         total_orders=total_orders)
 
 # --- Order Management API ---
+def pending_order_error(order_id):
+    """Explain why a conditional UPDATE on a pending order matched no row: it is missing or already processed"""
+    if not db.session.query(Order.query.filter_by(id=order_id).exists()).scalar():
+        return jsonify({'status': 'error', 'message': 'შეკვეთა ვერ მოიძებნა'}), 404
+    return jsonify({'status': 'error', 'message': 'შეკვეთა უკვე დამუშავებულია'}), 400
+
 @app.route('/api/order/confirm/<int:order_id>', methods=['POST'])
 @login_required
 def api_confirm_order(order_id):
@@ -289,17 +528,18 @@ def api_confirm_order(order_id):
         data = request.get_json() or {}
         comment = data.get('comment', '').strip()
         
-        order = Order.query.get(order_id)
-        if not order:
-            return jsonify({'status': 'error', 'message': 'შეკვეთა ვერ მოიძებნა'}), 404
-            
-        if order.status != 'pending':
-            return jsonify({'status': 'error', 'message': 'შეკვეთა უკვე დამუშავებულია'}), 400
-        
-        order.status = 'confirmed'
-        order.confirmed_at = datetime.utcnow()
-        order.admin_comment = comment
+        # A single conditional UPDATE, so two admins can't both process the same pending order
+        updated = db.session.execute(
+            db.update(Order)
+            .where(Order.id == order_id, Order.status == 'pending')
+            .values(status='confirmed', confirmed_at=datetime.utcnow(), admin_comment=comment),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if not updated:
+            db.session.rollback()
+            return pending_order_error(order_id)
         db.session.commit()
+        invalidate_pending_count()
         
         # NO EMAIL SENT HERE - Email was already sent when order was placed
         
@@ -317,17 +557,18 @@ def api_delete_order(order_id):
         data = request.get_json() or {}
         comment = data.get('comment', '').strip()
         
-        order = Order.query.get(order_id)
-        if not order:
-            return jsonify({'status': 'error', 'message': 'შეკვეთა ვერ მოიძებნა'}), 404
-            
-        if order.status != 'pending':
-            return jsonify({'status': 'error', 'message': 'შეკვეთა უკვე დამუშავებულია'}), 400
-        
-        order.status = 'deleted'
-        order.deleted_at = datetime.utcnow()
-        order.admin_comment = comment
+        # A single conditional UPDATE, so two admins can't both process the same pending order
+        updated = db.session.execute(
+            db.update(Order)
+            .where(Order.id == order_id, Order.status == 'pending')
+            .values(status='deleted', deleted_at=datetime.utcnow(), admin_comment=comment),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if not updated:
+            db.session.rollback()
+            return pending_order_error(order_id)
         db.session.commit()
+        invalidate_pending_count()
         
         return jsonify({'status': 'success', 'message': 'შეკვეთა წაიშალა'})
         
@@ -340,10 +581,16 @@ def api_delete_order(order_id):
 @login_required
 def api_clean_deleted_orders():
     try:
-        deleted_orders = Order.query.filter_by(status='deleted').all()
-        count = len(deleted_orders)
-        for order in deleted_orders:
-            db.session.delete(order)
+        # Two bulk DELETEs (items, then orders) instead of loading and cascading every order in Python
+        deleted_ids = db.select(Order.id).where(Order.status == 'deleted')
+        db.session.execute(
+            db.delete(OrderItem).where(OrderItem.order_id.in_(deleted_ids)),
+            execution_options={'synchronize_session': False}
+        )
+        count = db.session.execute(
+            db.delete(Order).where(Order.status == 'deleted'),
+            execution_options={'synchronize_session': False}
+        ).rowcount
         db.session.commit()
         return jsonify({'status': 'success', 'message': f'წარმატებით წაიშალა {count} შეკვეთა სამუდამოდ'})
     except Exception as e:
@@ -358,26 +605,42 @@ def api_edit_confirmed_order(order_id):
         data = request.get_json() or {}
         order_items = data.get('items', [])
         
-        order = Order.query.get(order_id)
+        order = db.session.get(Order, order_id)
         if not order:
             return jsonify({'status': 'error', 'message': 'შეკვეთა ვერ მოიძებნა'}), 404
             
         if order.status != 'confirmed':
             return jsonify({'status': 'error', 'message': 'მხოლოდ დადასტურებული შეკვეთების რედაქტირებაა შესაძლებელი'}), 400
         
-        # Delete existing order items
-        OrderItem.query.filter_by(order_id=order_id).delete()
-        
-        # Add new order items
+        # Requested quantity per item name; a name listed twice keeps its combined quantity
+        wanted = {}
         for item_data in order_items:
             if item_data.get('quantity', 0) > 0:
-                new_item = OrderItem(
-                    item_name=item_data['name'],
-                    quantity=item_data['quantity'],
-                    order_id=order_id
-                )
-                db.session.add(new_item)
-        
+                wanted[item_data['name']] = wanted.get(item_data['name'], 0) + item_data['quantity']
+        
+        # Write only the differences instead of deleting and re-inserting every line item
+        kept = {}
+        removed_ids = []
+        for order_item in order.order_items:
+            if order_item.item_name in wanted and order_item.item_name not in kept:
+                kept[order_item.item_name] = order_item
+            else:
+                removed_ids.append(order_item.id)
+        
+        new_rows = []
+        for item_name, quantity in wanted.items():
+            if item_name not in kept:
+                new_rows.append({'order_id': order_id, 'item_name': item_name, 'quantity': quantity})
+            elif kept[item_name].quantity != quantity:
+                kept[item_name].quantity = quantity
+        
+        if removed_ids:
+            db.session.execute(
+                db.delete(OrderItem).where(OrderItem.id.in_(removed_ids)),
+                execution_options={'synchronize_session': False}
+            )
+        if new_rows:
+            db.session.execute(db.insert(OrderItem), new_rows)
         db.session.commit()
         return jsonify({'status': 'success', 'message': 'შეკვეთა განახლდა წარმატებით'})
         
@@ -387,17 +650,38 @@ def api_edit_confirmed_order(order_id):
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
 # --- API Routes ---
+def catalog_json_response():
+    """Response with the precomputed catalog JSON, gzipped when the client accepts it"""
+    catalog = get_catalog()
+    if 'gzip' in request.accept_encodings:
+        response = app.response_class(catalog.json_gzip, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(f'{catalog.etag}-gzip')
+    else:
+        response = app.response_class(catalog.json_body, mimetype='application/json')
+        response.set_etag(catalog.etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/public/items/all.json')
+def api_public_items():
+    # The order page links here with ?v=<catalog hash>, so a new URL is used as soon as the catalog changes
+    response = catalog_json_response()
+    response.cache_control.public = True
+    response.cache_control.max_age = 300
+    return response.make_conditional(request)
+
 @app.route('/api/public/items/search')
 def api_public_search_items():
     query = request.args.get('q', '').strip()
     
     if not query:
-        items = Item.query.order_by(Item.name).all()
-    else:
-        items = Item.query.filter(Item.name.ilike(f'%{query}%')).order_by(Item.name).all()
+        # The full list only changes with the catalog, so clients revalidate it with If-None-Match
+        response = catalog_json_response()
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     
-    results = [{'id': item.id, 'name': item.name} for item in items]
-    return jsonify(results)
+    return jsonify(search_items(query))
 
 @app.route('/api/item/add', methods=['POST'])
 @login_required
@@ -409,16 +693,17 @@ def api_add_item():
         if not name:
             return jsonify({'status': 'error', 'message': 'ნივთის სახელი არ უნდა იყოს ცარიელი'}), 400
         
-        # Check if item already exists
-        if Item.query.filter_by(name=name).first():
-            return jsonify({'status': 'error', 'message': 'ეს ნივთი უკვე არსებობს'}), 400
-        
+        # The unique constraint on Item.name rejects duplicates, so no existence check is run first
         new_item = Item(name=name)
         db.session.add(new_item)
         db.session.commit()
+        invalidate_items()
         
         return jsonify({'status': 'success', 'item': {'id': new_item.id, 'name': new_item.name}})
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'ეს ნივთი უკვე არსებობს'}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Error adding item: {e}")
@@ -434,18 +719,25 @@ def api_bulk_add_items():
         if not items_text:
             return jsonify({'status': 'error', 'message': 'ნივთები არ არის მითითებული'}), 400
         
-        item_names = [name.strip() for name in items_text.splitlines() if name.strip()]
-        added_count = 0
-        skipped_count = 0
-        
-        for name in item_names:
-            if not Item.query.filter_by(name=name).first():
-                db.session.add(Item(name=name))
-                added_count += 1
-            else:
-                skipped_count += 1
-        
+        lines = [name for name in map(str.strip, items_text.splitlines()) if name]
+        # Repeated lines are collapsed up front (keeping paste order), so only distinct names reach the database
+        item_names = list(dict.fromkeys(lines))
+        if len(item_names) > MAX_BULK_ITEMS:
+            return jsonify({'status': 'error', 'message': f'ერთდროულად მაქსიმუმ {MAX_BULK_ITEMS} ნივთის დამატებაა შესაძლებელი'}), 413
+        
+        # A few chunked IN queries find every name that already exists instead of probing them one by one
+        existing = set()
+        for start in range(0, len(item_names), NAME_LOOKUP_CHUNK):
+            chunk = item_names[start:start + NAME_LOOKUP_CHUNK]
+            existing.update(name for (name,) in db.session.query(Item.name).filter(Item.name.in_(chunk)))
+        new_items = [Item(name=name) for name in item_names if name not in existing]
+        
+        # Insert all new items in one batch instead of through the per-object unit of work
+        db.session.bulk_save_objects(new_items)
         db.session.commit()
+        added_count = len(new_items)
+        skipped_count = len(lines) - added_count
+        invalidate_items()
         
         message = f'წარმატებით დაემატა {added_count} ნივთი.'
         if skipped_count > 0:
@@ -462,12 +754,13 @@ def api_bulk_add_items():
 @login_required
 def api_delete_item(item_id):
     try:
-        item = Item.query.get(item_id)
+        item = db.session.get(Item, item_id)
         if not item:
             return jsonify({'status': 'error', 'message': 'ნივთი ვერ მოიძებნა'}), 404
         
         db.session.delete(item)
         db.session.commit()
+        invalidate_items()
         return jsonify({'status': 'success', 'message': 'ნივთი წაიშალა'})
         
     except Exception as e:
@@ -485,19 +778,19 @@ def api_edit_item(item_id):
         if not new_name:
             return jsonify({'status': 'error', 'message': 'ნივთის სახელი არ უნდა იყოს ცარიელი'}), 400
         
-        item = Item.query.get(item_id)
+        item = db.session.get(Item, item_id)
         if not item:
             return jsonify({'status': 'error', 'message': 'ნივთი ვერ მოიძებნა'}), 404
         
-        # Check if new name already exists (excluding current item)
-        existing_item = Item.query.filter(Item.name == new_name, Item.id != item_id).first()
-        if existing_item:
-            return jsonify({'status': 'error', 'message': 'ეს სახელი უკვე გამოიყენება'}), 400
-        
+        # A name already used by another item fails the unique constraint on commit
         item.name = new_name
         db.session.commit()
+        invalidate_items()
         return jsonify({'status': 'success', 'message': 'ნივთი განახლდა'})
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'status': 'error', 'message': 'ეს სახელი უკვე გამოიყენება'}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Error editing item: {e}")
@@ -506,27 +799,102 @@ def api_edit_item(item_id):
 @app.route('/api/items/search')
 @login_required
 def api_search_items():
-    query = request.args.get('q', '')
-    items = Item.query.filter(Item.name.ilike(f'%{query}%')).order_by(Item.name).limit(20).all()
-    return jsonify([{'id': item.id, 'name': item.name} for item in items])
+    query = request.args.get('q', '').strip()
+    # Same in-memory catalog scan as the public search instead of a leading-wildcard LIKE over the table
+    return jsonify(search_items(query)[:20])
 
-# --- Session Saving Routes for Main Form ---
-@app.route('/save-progress', methods=['POST'])
-def save_progress():
+# --- Email Helper Function ---
+EMAIL_ITEM_ROW_TEMPLATE = (
+    '<tr>'
+    '<td style="padding: 8px; border: 1px solid #ddd;">{item}</td>'
+    '<td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{qty}</td>'
+    '</tr>'
+)
+
+NEW_ORDER_EMAIL_TEMPLATE = """\
+<html>
+<body style="font-family: Arial, sans-serif;">
+<div style="background-color: #f8f9fa; padding: 20px;">
+    <div style="background-color: white; border-radius: 10px; padding: 30px; max-width: 600px; margin: 0 auto; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
+        <h2 style="color: #f97316; border-bottom: 3px solid #f97316; padding-bottom: 10px; margin-top: 0;">
+            🔔 ახალი შეკვეთა
+        </h2>
+        <div style="margin: 20px 0; background-color: #fff7ed; padding: 15px; border-radius: 8px;">
+            <p style="margin: 10px 0;"><strong>მომხმარებლის სახელი:</strong> {customer_name}</p>
+            <p style="margin: 10px 0;"><strong>ოთახის ნომერი:</strong> {room_number}</p>
+            <p style="margin: 10px 0;"><strong>ტელეფონი:</strong> {customer_phone}</p>
+            <p style="margin: 10px 0;"><strong>თარიღი:</strong> {order_date}</p>
+        </div>
+        <h3 style="color: #333; margin-top: 20px;">შეკვეთის ნივთები:</h3>
+        <table style="width: 100%; border-collapse: collapse; border: 1px solid #ddd; margin-top: 10px;">
+            <thead>
+                <tr style="background-color: #f2f2f2;">
+                    <th style="padding: 12px; border: 1px solid #ddd; text-align: left;">ნივთი</th>
+                    <th style="padding: 12px; border: 1px solid #ddd; text-align: center;">რაოდენობა</th>
+                </tr>
+            </thead>
+            <tbody>{item_rows}</tbody>
+        </table>
+        <div style="margin-top: 20px; padding: 15px; background-color: #e0f2fe; border-radius: 8px;">
+            <p style="margin: 0; color: #0369a1; font-size: 14px;">
+                <strong>⚠️ სტატუსი:</strong> ახალი შეკვეთა - საჭიროებს დადასტურებას ადმინ პანელში
+            </p>
+        </div>
+    </div>
+</div>
+</body>
+</html>"""
+
+# One authenticated SMTP connection shared by all sends, so STARTTLS + login is not repeated per order
+_smtp_lock = threading.Lock()
+_smtp_conn = None
+
+# Notifications are sent off the request thread; one worker matches the single shared connection
+_mail_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='mail')
+
+def _get_smtp():
+    """Return the shared SMTP connection, opening and logging in on first use or after it was dropped"""
+    global _smtp_conn
+    if _smtp_conn is not None:
+        return _smtp_conn
+    
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
+    server.starttls()
+    server.login(EMAIL_SENDER, EMAIL_PASSWORD)
+    _smtp_conn = server
+    return server
+
+def _close_smtp():
+    global _smtp_conn
     try:
-        session['form_data'] = request.get_json()
-        session.modified = True
-        return jsonify(success=True)
-    except Exception as e:
-        print(f"Error saving progress: {e}")
-        return jsonify(success=False), 500
-
-@app.route('/clear-session', methods=['POST'])
-def clear_session():
-    session.pop('form_data', None)
-    return jsonify(success=True)
+        _smtp_conn.quit()
+    except Exception:
+        pass
+    _smtp_conn = None
+
+def _smtp_connection_lost(error):
+    """True if a send failed because the shared connection is gone rather than because the message was refused"""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code == 421  # server closing the channel, e.g. after an idle timeout
+    # Any other SMTPException is a protocol-level refusal; a plain OSError is a socket failure
+    return not isinstance(error, smtplib.SMTPException) and isinstance(error, OSError)
+
+def _send_mail(msg):
+    """Send a message over the shared connection; a failed send drops it so the next one reconnects"""
+    body = msg.as_string()
+    with _smtp_lock:
+        # No NOOP probe before each send: if the server closed the idle connection, reconnect once and retry
+        for attempt in range(2):
+            try:
+                _get_smtp().sendmail(EMAIL_SENDER, EMAIL_RECEIVER, body)
+                return
+            except Exception as e:
+                _close_smtp()
+                if attempt or not _smtp_connection_lost(e):
+                    raise
 
-# --- Email Helper Function ---
 def send_new_order_notification(customer_name, customer_phone, room_number, order):
     """Send email notification when a NEW order is placed by customer"""
     if not all([EMAIL_SENDER, EMAIL_PASSWORD, EMAIL_RECEIVER]):
@@ -540,53 +908,21 @@ def send_new_order_notification(customer_name, customer_phone, room_number, orde
         msg['Subject'] = f'🔔 ახალი შეკვეთა! {customer_name} (ოთახი {room_number})'
         
         item_rows = "".join(
-            f'<tr>'
-            f'<td style="padding: 8px; border: 1px solid #ddd;">{item}</td>'
-            f'<td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{qty}</td>'
-            f'</tr>' 
-            for item, qty in order.items()
+            EMAIL_ITEM_ROW_TEMPLATE.format(item=escape(item), qty=qty) for item, qty in order.items()
         )
         
-        html_body = f"""
-        <html>
-        <body style="font-family: Arial, sans-serif;">
-        <div style="background-color: #f8f9fa; padding: 20px;">
-            <div style="background-color: white; border-radius: 10px; padding: 30px; max-width: 600px; margin: 0 auto; box-shadow: 0 2px 10px rgba(0,0,0,0.1);">
-                <h2 style="color: #f97316; border-bottom: 3px solid #f97316; padding-bottom: 10px; margin-top: 0;">
-                    🔔 ახალი შეკვეთა
-                </h2>
-                <div style="margin: 20px 0; background-color: #fff7ed; padding: 15px; border-radius: 8px;">
-                    <p style="margin: 10px 0;"><strong>მომხმარებლის სახელი:</strong> {customer_name}</p>
-                    <p style="margin: 10px 0;"><strong>ოთახის ნომერი:</strong> {room_number}</p>
-                    <p style="margin: 10px 0;"><strong>ტელეფონი:</strong> {customer_phone}</p>
-                    <p style="margin: 10px 0;"><strong>თარიღი:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M')}</p>
-                </div>
-                <h3 style="color: #333; margin-top: 20px;">შეკვეთის ნივთები:</h3>
-                <table style="width: 100%; border-collapse: collapse; border: 1px solid #ddd; margin-top: 10px;">
-                    <thead>
-                        <tr style="background-color: #f2f2f2;">
-                            <th style="padding: 12px; border: 1px solid #ddd; text-align: left;">ნივთი</th>
-                            <th style="padding: 12px; border: 1px solid #ddd; text-align: center;">რაოდენობა</th>
-                        </tr>
-                    </thead>
-                    <tbody>{item_rows}</tbody>
-                </table>
-                <div style="margin-top: 20px; padding: 15px; background-color: #e0f2fe; border-radius: 8px;">
-                    <p style="margin: 0; color: #0369a1; font-size: 14px;">
-                        <strong>⚠️ სტატუსი:</strong> ახალი შეკვეთა - საჭიროებს დადასტურებას ადმინ პანელში
-                    </p>
-                </div>
-            </div>
-        </div>
-        </body>
-        </html>"""
+        # Customer input is escaped so it can't inject markup into the email
+        html_body = NEW_ORDER_EMAIL_TEMPLATE.format(
+            customer_name=escape(customer_name),
+            room_number=escape(room_number),
+            customer_phone=escape(customer_phone),
+            order_date=datetime.now().strftime('%Y-%m-%d %H:%M'),
+            item_rows=item_rows
+        )
         
         msg.attach(MIMEText(html_body, 'html'))
         
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-            server.sendmail(EMAIL_SENDER, EMAIL_RECEIVER, msg.as_string())
+        _send_mail(msg)
         
         print(f"✅ Email notification sent successfully for order from: {customer_name}")
         return True
@@ -598,7 +934,12 @@ def send_new_order_notification(customer_name, customer_phone, room_number, orde
 # --- Error Handlers ---
 @app.errorhandler(404)
 def not_found(error):
-    return render_template('index.html'), 404
+    return render_template('index.html', items_version=get_catalog().etag), 404
+
+@app.errorhandler(429)
+def too_many_requests(error):
+    flash('⚠️ ძალიან ბევრი მცდელობა. გთხოვთ სცადოთ ერთ წუთში.', 'warning')
+    return render_template('admin_login.html'), 429
 
 @app.errorhandler(500)
 def internal_error(error):
@@ -613,5 +954,5 @@ if __name__ == '__main__':
         db.create_all()
         print("✅ Database initialized successfully")
     
-    # Run the app
-    app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
+    # Run the development server (production runs under gunicorn, see Dockerfile)
+    app.run(host='0.0.0.0', port=5001, debug=os.getenv('FLASK_DEBUG') == '1')
\ No newline at end of file
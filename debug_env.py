@@ -3,6 +3,10 @@
 Debug script to find issues in .env file
 Run this to identify problems with your .env file formatting
 """
+import re
+
+# Characters that need the value to be quoted, compiled once instead of rescanned per character on every line
+SPECIAL_CHARS_RE = re.compile(r'[$!@#%^&*(){}\[\]|\\;:<>,?]')
 
 def debug_env_file(filepath='.env'):
     """
@@ -44,8 +48,7 @@ def debug_env_file(filepath='.env'):
         if '=' in line:
             key, _, value = line.partition('=')
             value = value.strip()
-            special_chars = ['$', '!', '@', '#', '%', '^', '&', '*', '(', ')', '{', '}', '[', ']', '|', '\\', ';', ':', '<', '>', ',', '?']
-            if any(char in value for char in special_chars) and not (value.startswith('"') or value.startswith("'")):
+            if SPECIAL_CHARS_RE.search(value) and not value.startswith(('"', "'")):
                 problems.append("Special characters without quotes")
         
         # Issue 5: Tab characters
@@ -4,12 +4,23 @@ import os
 # Path to your database
 db_path = os.path.join('data', 'inventory.db')
 
+# Indexes declared on the models; create_all() only adds them to new databases
+indexes = [
+    ('ix_order_status_timestamp', "'order'", 'status, timestamp'),
+    ('ix_order_status_confirmed_at', "'order'", 'status, confirmed_at'),
+    ('ix_order_status_deleted_at', "'order'", 'status, deleted_at'),
+    ('ix_order_item_order_id', 'order_item', 'order_id'),
+]
+
 # Connect to the database
 conn = sqlite3.connect(db_path)
 cursor = conn.cursor()
 
 print("Starting database migration...")
 
+# WAL is stored in the database file, so setting it once here makes it the mode for every later connection
+cursor.execute("PRAGMA journal_mode=WAL")
+
 # Check if columns already exist
 cursor.execute("PRAGMA table_info('order')")
 columns = [column[1] for column in cursor.fetchall()]
@@ -25,44 +36,43 @@ if 'confirmed_at' not in columns:
 if 'deleted_at' not in columns:
     migrations_needed.append('deleted_at')
 
-if not migrations_needed:
-    print("✅ Database is already up to date!")
-    conn.close()
-    exit()
+if migrations_needed:
+    print(f"Adding columns: {', '.join(migrations_needed)}")
+else:
+    print("✓ Columns are already up to date")
 
-print(f"Adding columns: {', '.join(migrations_needed)}")
+# Column definitions for the columns that may be missing
+column_definitions = {
+    'status': "VARCHAR(20) DEFAULT 'pending'",
+    'admin_comment': 'TEXT',
+    'confirmed_at': 'DATETIME',
+    'deleted_at': 'DATETIME',
+}
 
-try:
-    # Add new columns
-    if 'status' in migrations_needed:
-        cursor.execute("ALTER TABLE 'order' ADD COLUMN status VARCHAR(20) DEFAULT 'pending'")
-        print("✓ Added 'status' column")
-    
-    if 'admin_comment' in migrations_needed:
-        cursor.execute("ALTER TABLE 'order' ADD COLUMN admin_comment TEXT")
-        print("✓ Added 'admin_comment' column")
-    
-    if 'confirmed_at' in migrations_needed:
-        cursor.execute("ALTER TABLE 'order' ADD COLUMN confirmed_at DATETIME")
-        print("✓ Added 'confirmed_at' column")
-    
-    if 'deleted_at' in migrations_needed:
-        cursor.execute("ALTER TABLE 'order' ADD COLUMN deleted_at DATETIME")
-        print("✓ Added 'deleted_at' column")
-    
+statements = [f"ALTER TABLE 'order' ADD COLUMN {column} {column_definitions[column]}" for column in migrations_needed]
+if migrations_needed:
     # Update existing orders to have 'pending' status
-    cursor.execute("UPDATE 'order' SET status = 'pending' WHERE status IS NULL")
-    print("✓ Updated existing orders to 'pending' status")
-    
-    # Commit changes
-    conn.commit()
+    statements.append("UPDATE 'order' SET status = 'pending' WHERE status IS NULL")
+# Add indexes (no-op for the ones that already exist)
+statements += [f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({index_columns})" for name, table, index_columns in indexes]
+
+try:
+    # Run every change as one transaction: a single commit, and all or nothing on failure
+    cursor.executescript("BEGIN;\n" + ";\n".join(statements) + ";\nCOMMIT;")
+
+    for column in migrations_needed:
+        print(f"✓ Added '{column}' column")
+    if migrations_needed:
+        print("✓ Updated existing orders to 'pending' status")
+    print(f"✓ Ensured indexes: {', '.join(name for name, _, _ in indexes)}")
+
     print("\n✅ Migration completed successfully!")
     print("You can now restart your Flask application.")
-    
+
 except Exception as e:
     conn.rollback()
     print(f"\n❌ Migration failed: {e}")
     print("Your database has been rolled back to its previous state.")
 
 finally:
-    conn.close()
\ No newline at end of file
+    conn.close()
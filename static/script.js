@@ -25,6 +25,17 @@ document.addEventListener('DOMContentLoaded', () => {
     // ------------------------------------------------------------------------
     const orderForm = document.getElementById('orderForm');
     if (orderForm) {
+        // The unsent order is kept in the browser's localStorage, so autosaving never hits the server
+        const DRAFT_KEY = 'form_data';
+
+        function loadDraft() {
+            try {
+                return JSON.parse(localStorage.getItem(DRAFT_KEY)) || {};
+            } catch (e) {
+                return {};
+            }
+        }
+
         function autoSave() {
             const customer_name = document.getElementById('customer_name_input').value;
             const customer_phone = document.getElementById('customer_phone_input').value;
@@ -33,12 +44,24 @@ document.addEventListener('DOMContentLoaded', () => {
             document.querySelectorAll("input[name^='qty_']").forEach(input => {
                 quantities[input.name] = input.value;
             });
-            return fetch("/save-progress", {
-                method: "POST",
-                headers: {"Content-Type": "application/json"},
-                body: JSON.stringify({ customer_name, customer_phone, room_number, quantities })
-            });
+            try {
+                localStorage.setItem(DRAFT_KEY, JSON.stringify({ customer_name, customer_phone, room_number, quantities }));
+            } catch (e) {
+                // Storage is full or disabled; the draft just won't survive a reload
+            }
+        }
+
+        // Only the order POST flashes 'order_success', so other success messages (e.g. admin logout) keep the draft
+        if (document.querySelector('.flash-message[data-category="order_success"]')) {
+            try {
+                localStorage.removeItem(DRAFT_KEY);
+            } catch (e) {}
         }
+        const formData = loadDraft();
+        ['customer_name', 'customer_phone', 'room_number'].forEach(field => {
+            const input = document.getElementById(`${field}_input`);
+            if (input && formData[field]) input.value = formData[field];
+        });
 
         const debouncedAutoSave = debounce(autoSave, 500);
         document.addEventListener('input', (event) => {
@@ -64,15 +87,13 @@ document.addEventListener('DOMContentLoaded', () => {
                 selectedItemsTable.appendChild(newRow);
             }
 
-            // --- UPDATED: Preload items from data attribute for instant display and local search ---
-            const allItemsData = JSON.parse(itemSelector.dataset.items || '[]');
-            console.log('Total items loaded:', allItemsData.length); 
+            // Options are filled in once the item catalog has been fetched (see below)
             const tomselect = new TomSelect('#item-select', {
                 plugins: ['remove_button'],
                 valueField: 'id',
                 labelField: 'name',
                 searchField: 'name',
-                options: allItemsData,
+                options: [],
                 maxOptions: null,
                 sortField: {
                     field: 'name',
@@ -116,24 +137,33 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
             });
 
-            // --- Restore saved state on page load ---
-            if (typeof formData !== 'undefined' && formData && formData.quantities) {
-                const itemMap = new Map(allItemsData.map(item => [item.id.toString(), item.name]));
-                for (const key in formData.quantities) {
-                    const itemId = key.replace('qty_', '');
-                    const quantity = formData.quantities[key];
-                    if (quantity > 0) {
-                        const itemName = itemMap.get(itemId);
-                        if (itemName) {
-                            tomselect.addOption({id: itemId, name: itemName});
-                            tomselect.addItem(itemId, true);
-                            addQuantityRow(itemId, itemName, quantity);
+            // --- Load the item catalog, then restore saved state ---
+            // The URL carries the catalog version, so the browser can reuse its cached copy until an item changes
+            fetch(itemSelector.dataset.itemsUrl)
+                .then(r => r.json())
+                .then(allItemsData => {
+                    console.log('Total items loaded:', allItemsData.length);
+                    tomselect.addOptions(allItemsData);
+                    tomselect.refreshOptions(false);
+
+                    if (formData.quantities) {
+                        const itemMap = new Map(allItemsData.map(item => [item.id.toString(), item.name]));
+                        for (const key in formData.quantities) {
+                            const itemId = key.replace('qty_', '');
+                            const quantity = formData.quantities[key];
+                            if (quantity > 0) {
+                                const itemName = itemMap.get(itemId);
+                                if (itemName) {
+                                    tomselect.addOption({id: itemId, name: itemName});
+                                    tomselect.addItem(itemId, true);
+                                    addQuantityRow(itemId, itemName, quantity);
+                                }
+                            }
                         }
                     }
-                }
-            } else {
-                fetch('/clear-session', { method: 'POST' });
-            }
+                    toggleClearButton();
+                })
+                .catch(err => console.error('Failed to load items:', err));
             
             // Initial check for button visibility
             toggleClearButton();
@@ -225,6 +255,8 @@ document.addEventListener('DOMContentLoaded', () => {
                     window.location.href = '/admin/';
                     return;
                 }
+                // The server ignores one-character queries; keep the current list until there is more to match
+                if (query.length < 2) return;
                 fetch(`/api/items/search?q=${encodeURIComponent(query)}`)
                     .then(r => r.json()).then(items => {
                         if (itemList) itemList.innerHTML = '';